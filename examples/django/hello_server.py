@@ -4,10 +4,13 @@
 Launch a Django webapp serving "Hello, world" pages via fastcgi and a Nginx web server to handle the HTTP front-end.
 """
 
+import logging
 import os
 import signal
 import sys
 
+log = logging.getLogger("servermgr")
+
 def add_servermgr_to_path():
     """
     locate our servermgr directory and add it to python path for both 
@@ -17,20 +20,25 @@ def add_servermgr_to_path():
     for dir in ("..", "../..", "../../.."):
         if os.path.exists(os.path.join(dir, "servermgr")):
             pp = os.environ.get("PYTHONPATH", None)
-            new_pp = ':'.join(dir, pp) if pp else dir
-            os.environ["PYTHONPATH"] = new_pp
-            sys.path.insert(0, dir)
+            if not pp:
+                os.environ["PYTHONPATH"] = dir
+            elif dir not in pp.split(':'):
+                os.environ["PYTHONPATH"] = ':'.join((dir, pp))
+            if dir not in sys.path:
+                sys.path.insert(0, dir)
             break
 
 def interrupt(_unused_signum, _unused_frame):
     """Handle user stopping with control-C."""
-    print >> sys.stderr, "Keyboard interrupt, exiting."
+    log.info("Keyboard interrupt, exiting.")
     sys.exit()
 
 def main():
 
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(message)s")
     add_servermgr_to_path()    
 
+    from servermgr import base
     from servermgr import django_app
     from servermgr import nginx
 
@@ -40,15 +48,17 @@ def main():
     signal.signal(signal.SIGINT, interrupt)
     
     django_server = django_app.Manager("localhost", FCGI_PORT, "hello.settings", process_name="Sample Django App: Hello Server")
-    django_server.start()
-    print >> sys.stderr, "Starting django app..."
+    log.info("Starting django app...")
+    django_server.start(wait=False)
 
     nginx_server = nginx.Manager("localhost", HTTP_PORT, "/tmp/nginx")
     nginx_server.add_fastcgi_mapping("/", "localhost:8081")
-    nginx_server.start()
-    print >> sys.stderr, "Starting nginx front end on port %d..." % HTTP_PORT
+    log.info("Starting nginx front end on port %d...", HTTP_PORT)
+    nginx_server.start(wait=False)
+
+    base.ready_wait_all([django_server, nginx_server])
 
-    print >> sys.stderr, "Waiting for nginx to exit..."
+    log.info("Waiting for nginx to exit...")
     nginx_server.wait()
 
 
@@ -0,0 +1,33 @@
+# -*- mode: python; tab-width:8; py-indent-offset:4; indent-tabs-mode:nil -*-
+
+"""
+Entry point for the Django subprocess started by django_app.Manager.
+
+Running this module with 'python -m' lets python use the cached bytecode 
+instead of compiling a '-c' program on every start.
+"""
+
+import optparse
+
+from servermgr import django_app
+
+def main():
+    """Parse the arguments passed by django_app.Manager.start() and run the app."""
+
+    parser = optparse.OptionParser(usage="usage: %prog [options]")
+    parser.add_option("--host", action="store", dest="host", help="django app host")
+    parser.add_option("--port", action="store", type="int", dest="port", help="django app port")
+    parser.add_option("--settings", action="store", dest="settings", help="Django settings module name")
+    parser.add_option("--settings-dir", action="store", dest="settings_dir", help="directory containing the settings module")
+    parser.add_option("--process-name", action="store", dest="process_name", default="", help="process name")
+    (options, _unused_args) = parser.parse_args()
+
+    for required in "host", "port", "settings", "settings_dir":
+        if getattr(options, required) is None:
+            parser.error("--%s is required" % required.replace("_", "-"))
+
+    django_app.Manager.launch(options.host, options.port, options.settings, options.settings_dir,
+                              process_name=options.process_name or None)
+
+if __name__ == "__main__":
+    main()
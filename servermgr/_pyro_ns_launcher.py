@@ -0,0 +1,28 @@
+# -*- mode: python; tab-width:8; py-indent-offset:4; indent-tabs-mode:nil -*-
+
+"""
+Entry point for the name server subprocess started by pyro_ns.Manager.
+
+Usage: python -m servermgr._pyro_ns_launcher PROCESS_NAME [pyro-ns arguments]
+
+This does what the **pyro-ns** script installed by Pyro does, after first 
+setting the string displayed by 'ps' to PROCESS_NAME.
+"""
+
+import sys
+
+from servermgr import my_setproctitle
+
+def main():
+    """Set the process title, then run the Pyro name server with the remaining arguments."""
+
+    process_name = sys.argv[1]
+    if process_name:
+        my_setproctitle.setproctitle(process_name)
+
+    # Import Pyro only after the title is set;
+    import Pyro.naming
+    Pyro.naming.main(sys.argv[2:])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# -*- mode: python; tab-width:8; py-indent-offset:4; indent-tabs-mode:nil -*-
+
+"""
+Entry point for the service subprocess started by pyro_service.Manager.
+
+The service is started in a fresh interpreter, so its memory holds only 
+Pyro and the service's own imports rather than a copy of the parent process.
+"""
+
+import optparse
+
+from servermgr import pyro_service
+
+def main():
+    """Parse the arguments passed by pyro_service.Manager.start() and run the service."""
+
+    parser = optparse.OptionParser(usage="usage: %prog [options]")
+    parser.add_option("--service", action="store", dest="service", help="service class, as module:classname")
+    parser.add_option("--service-name", action="store", dest="service_name", help="Pyro service name")
+    parser.add_option("--ns-host", action="store", dest="ns_host", help="Pyro nameserver host")
+    parser.add_option("--ns-port", action="store", type="int", dest="ns_port", help="Pyro nameserver port")
+    parser.add_option("--proctitle", action="store", dest="proctitle", default="", help="ps display string")
+    parser.add_option("--prewarm", action="store_true", dest="prewarm", default=False,
+                      help="initialize, then wait for a byte on stdin before serving")
+    (options, _unused_args) = parser.parse_args()
+
+    for required in "service", "service_name", "ns_host", "ns_port":
+        if getattr(options, required) is None:
+            parser.error("--%s is required" % required.replace("_", "-"))
+
+    pyro_service.Manager.launch(options.service, options.service_name, options.ns_host, options.ns_port,
+                                process_name=options.proctitle or None, wait_for_release=options.prewarm)
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,20 @@
 Interface definition and base implementation for all subprocess managers.
 """
 
+import atexit
+import errno
+import fcntl
+import functools
+import os
+import select
+import signal
 import socket
+import struct
 import time
 
+import readiness
+from readiness import monotonic
+
 #pylint: disable=R0921
 #abstract class not implemented;
 
@@ -76,22 +87,67 @@ class WorkerError(Exception):
         return val + " " + str(self.exception)
 
 
+def connect_probe(host, port, timeout=0.2):
+    """
+    Open a tcp connection to host:port, then close it immediately.
+
+    The socket is closed with SO_LINGER set to 0 so that repeated probes
+    do not leave connections behind in TIME_WAIT.
+
+    :param host: the interface to check;
+    :type host: string
+    :param port: the post to check;
+    :type port: int
+    :param timeout: give up on the connection attempt after this many seconds.
+    :type timeout: float, seconds
+    :raises: **socket.error** (or **socket.timeout**) if the connection fails.
+    """
+    s__ = socket.create_connection((host, port), timeout)
+    s__.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+    s__.close()
+
 def address_in_use(host, port):
     """
     Check to see if there is a listener on host:port.
 
+    Addresses of this host are checked by trying to bind them; for other 
+    addresses, this tries to connect, waiting up to a second for each.
+
     :param host: the interface to check;
     :type host: string
     :param port: the post to check;
     :type port: int
     :returns: **True** if there is a listener, else **False**.
     """
-    try:
-        s__ = socket.create_connection((host, port))
-        s__.close()
-        return True
-    except socket.error:
-        return False
+
+    # Try to bind the address rather than connect to it; this needs no
+    # handshake, and any server already there never sees the probe.
+    # SO_REUSEADDR keeps connections in TIME_WAIT from counting as in use.
+    # Check every address host resolves to, e.g. both ::1 and 127.0.0.1;
+    remote = []
+    for family, socktype, proto, _unused_name, addr in \
+            socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM):
+        s__ = socket.socket(family, socktype, proto)
+        try:
+            s__.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s__.bind(addr)
+        except socket.error, ex:
+            if ex.errno == errno.EADDRINUSE:
+                return True
+            if ex.errno == errno.EADDRNOTAVAIL:
+                # Not an address of this host, so we can't bind it;
+                remote.append(addr)
+        finally:
+            s__.close()
+
+    # For addresses elsewhere, fall back to seeing whether anything accepts a connection;
+    for addr in remote:
+        try:
+            connect_probe(addr[0], addr[1], timeout=1.0)
+            return True
+        except socket.error:
+            pass
+    return False
 
 def address_free_check(host, port):
     """
@@ -108,32 +164,150 @@ def address_free_check(host, port):
         raise WorkerError(None, "address already in use", host, port)
 
 
+_devnull = None
+
+def devnull():
+    """
+    Return a file object open on /dev/null, for discarding subprocess output.
+
+    The file is opened the first time this is called and shared from then on.
+    """
+    global _devnull  #pylint: disable=W0603
+    if _devnull is None:
+        _devnull = open(os.devnull, "r+b")
+    return _devnull
+
+def drain_pipe(pipe, timeout=1.0):
+    """
+    Read whatever a non-blocking pipe has to offer, for at most *timeout* seconds.
+
+    :param pipe: the pipe to read from.
+    :type pipe: file object
+    :param timeout: stop reading after this many seconds, even if the pipe is still open.
+    :type timeout: float, seconds
+    :returns: the data read from the pipe.
+    """
+    fd__ = pipe.fileno()
+    chunks = []
+    deadline = monotonic() + timeout
+    while True:
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            break
+        readable, _unused_w, _unused_x = select.select([fd__], [], [], remaining)
+        if not readable:
+            break
+        try:
+            data = os.read(fd__, 4096)
+        except OSError, ex:
+            if ex.errno in (errno.EAGAIN, errno.EINTR):
+                continue
+            raise
+        if not data:
+            break
+        chunks.append(data)
+    return "".join(chunks)
+
+
+# The directory holding the servermgr package; see launcher_env();
+_package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def launcher_env(env=None):
+    """
+    Return an environment for running 'python -m servermgr.<launcher>'.
+
+    The directory holding the servermgr package is put at the front of 
+    PYTHONPATH, so the child can import servermgr even when it is neither 
+    installed nor on the parent's PYTHONPATH.
+
+    :param env: the environment to start from; defaults to os.environ.
+    :type env: dict
+    :returns: a new environment dict.
+    """
+    env = dict(os.environ if env is None else env)
+    path = env.get("PYTHONPATH")
+    env["PYTHONPATH"] = _package_parent + (os.pathsep + path if path else "")
+    return env
+
+
 class BaseProcess(object):
     """
     Base class for class wrapper functionality 
     used by SubprocessWrapper and MultiprocessingWrapper.
     """
+    __slots__ = ("process", "has_stderr")
+
     def __init__(self, process_thing):
         self.process = process_thing
+        self.has_stderr = getattr(process_thing, "stderr", None) is not None
+
+    @property
+    def pid(self):
+        """The process id of the wrapped process."""
+        return self.process.pid
 
-    def __getattr__(self, attrib):
-        return getattr(self.process, attrib)
+    @property
+    def stderr(self):
+        """The stderr pipe of the wrapped process, or **None**."""
+        return self.process.stderr
+
+    def poll(self):
+        """Return **None** if the process is still running, else its exit status."""
+        return self.process.poll()
+
+    def terminate(self):
+        """Send SIGTERM to the process."""
+        self.process.terminate()
+
+    def wait(self):
+        """Wait for the process to exit."""
+        return self.process.wait()
 
 class SubprocessWrapper(BaseProcess):
     """
     This class is a wrapper around subprocess.Popen to unify the interface 
     with multiprocssing.Process.
     """
+    __slots__ = ()
+
+    def __init__(self, process_thing):
+        super(SubprocessWrapper, self).__init__(process_thing)
+
+        # Make stderr non-blocking so ready_wait can't hang reading it;
+        if self.has_stderr:
+            fd__ = process_thing.stderr.fileno()
+            flags = fcntl.fcntl(fd__, fcntl.F_GETFL)
+            fcntl.fcntl(fd__, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
     def join(self, _unused_timeout=None):
         """Add join method to subprocess.Popen."""
         self.process.wait()
 
+    @property
+    def returncode(self):
+        """The exit status of the process, or **None** if it hasn't been collected yet."""
+        return self.process.returncode
+
+    def kill(self):
+        """Send SIGKILL to the process."""
+        self.process.kill()
+
+    def send_signal(self, signum):
+        """Send signal *signum* to the process."""
+        self.process.send_signal(signum)
+
 
 class MultiprocessingWrapper(BaseProcess):
     """
     This class is a wrapper around multiprocessing.Process to unify the interface 
     with subprocess.Popen.
     """
+    __slots__ = ()
+
+    @property
+    def stderr(self):
+        """multiprocessing.Process has no stderr pipe."""
+        return None
 
     def wait(self):
         """Add wait method to multiprocessing.Process."""
@@ -141,9 +315,38 @@ class MultiprocessingWrapper(BaseProcess):
 
     def poll(self):
         """Add poll method to multiprocessing.Process."""
-        if self.process.is_alive():
-            return None
-        return True
+        if self.process.pid is None:
+            # not started yet;
+            if self.process.is_alive():
+                return None
+            return True
+
+        # exitcode does a single waitpid(WNOHANG), and remembers the result;
+        return self.process.exitcode
+
+    def join(self, timeout=None):
+        """Wait at most *timeout* seconds for the process to exit."""
+        self.process.join(timeout)
+
+    def is_alive(self):
+        """Return **True** if the process is running."""
+        return self.process.is_alive()
+
+    @property
+    def exitcode(self):
+        """The exit status of the process, or **None** if it is still running."""
+        return self.process.exitcode
+
+    # Match subprocess.Popen;
+    returncode = exitcode
+
+    def kill(self):
+        """Send SIGKILL to the process; multiprocessing.Process has no kill() of its own."""
+        os.kill(self.process.pid, signal.SIGKILL)
+
+    def send_signal(self, signum):
+        """Send signal *signum* to the process."""
+        os.kill(self.process.pid, signum)
 
 def wrap_process(process_thing):
     """Wrap the (Popen, Process) in the proper wrapper to provide uniform functionality."""
@@ -154,12 +357,65 @@ def wrap_process(process_thing):
         obj = MultiprocessingWrapper(process_thing)
     return obj
 
+
+# Worker processes that managers have started and not yet stopped or 
+# waited for; a manager that is dropped without stopping its worker 
+# leaves it here, for _stop_live_processes() to clean up;
+_live_processes = set()
+
+def _stop_live_processes():
+    """Terminate any worker processes still running at interpreter exit."""
+
+    for process in list(_live_processes):
+        try:
+            if process.poll() == None:
+                process.terminate()
+            process.wait()
+        except Exception:  #pylint: disable=W0703
+            pass
+    _live_processes.clear()
+
+atexit.register(_stop_live_processes)
+
+
+def cached_health(method):
+    """
+    Decorator for a Manager's health() method.
+
+    For *self.health_ttl* seconds after a check, calls to health() repeat 
+    its outcome, returning the same result or raising the same WorkerError, 
+    instead of checking the worker again. Use Manager.invalidate_health() 
+    to force the next call to make a live check.
+    """
+
+    @functools.wraps(method)
+    def health(self):
+        "Check health, or repeat the outcome of a recent check."
+
+        now = monotonic()
+        last = self._last_health  #pylint: disable=W0212
+        if last and now - last[0] < self.health_ttl:
+            if last[2] is not None:
+                raise last[2]
+            return last[1]
+
+        try:
+            result = method(self)
+        except WorkerError, ex:
+            self._last_health = (now, None, ex)  #pylint: disable=W0212
+            raise
+        self._last_health = (now, result, None)  #pylint: disable=W0212
+        return result
+
+    return health
+
         
 #pylint: disable=R0922
 #abstract class only referenced one time;
 class Manager(object):
     """
     :param name: Name of manager, displayed in error and log messages.
+    :param process_name: the string the worker should display in 'ps', if it can.
     :param kwargs: Any other keyword args will be stored in self.kwargs.
 
     This is the base implementation of the Manager class.
@@ -169,6 +425,10 @@ class Manager(object):
     * ready_wait()
     * stop()
     * wait()
+
+    A Manager may be used as a context manager; the worker is started on 
+    entry and stopped on exit. Workers that are still running when the 
+    interpreter exits are stopped by an atexit handler.
     
     The following methods must be implemented by the subclass:
 
@@ -176,13 +436,20 @@ class Manager(object):
     * start()
     """
 
-    def __init__(self, name="<unnamed>", **kwargs):
+    def __init__(self, name="<unnamed>", process_name=None, **kwargs):
         """Initialize the Manager object."""
         self._process = None
         self.name = name
+        self.process_name = process_name
         self.kwargs = kwargs
+        self._last_health = None
+
+    def __enter__(self):
+
+        self.start()
+        return self
 
-    def __del__(self):
+    def __exit__(self, _unused_type, _unused_value, _unused_traceback):
 
         self.stop()
 
@@ -196,7 +463,11 @@ class Manager(object):
     def process(self, process):
         "Wrap the (subprocess.Popen, multiprocessing.Process) with a proxy class."
 
+        # The old process has been stopped or waited for, or is being let go;
+        _live_processes.discard(self._process)
         self._process = wrap_process(process) if process else None
+        if self._process:
+            _live_processes.add(self._process)
 
     def health(self):
         """Check the worker subprocess health.
@@ -205,6 +476,19 @@ class Manager(object):
         """
         raise NotImplementedError
 
+    def invalidate_health(self):
+        """Forget the outcome of the last health check; see cached_health()."""
+
+        self._last_health = None
+
+    def health_async(self, executor):
+        """Submit a health check to *executor*, which must provide submit().
+
+        :returns: the future returned by executor.submit(); its result() 
+          raises **WorkerError** if the worker is not healthy.
+        """
+        return executor.submit(self.health)
+
     def start(self, wait=True, timeout=10.0):
         """
         Start the worker subprocess.
@@ -227,31 +511,46 @@ class Manager(object):
         if not self.process:
             raise WorkerError(None, self.name + " No subprocess")
 
-        start_time = time.time()
-        time_delta = 0.5
+        start_time = monotonic()
+        if getattr(self, "port", None) and hasattr(select, "epoll"):
+            # Block until the port is up rather than polling health() for it;
+            # the loop below then checks health and reports any failure;
+            try:
+                readiness.wait_tcp_up(self.host, self.port, self.process.pid, start_time + timeout)
+            except readiness.NotReady:
+                pass
+
+        attempts = 0
         status = self.process.poll()
         while status == None:  # status == None => process is running;
             try:
+                # Startup needs to see the worker's current state;
+                self.invalidate_health()
                 self.health()
                 if verbose:
                     print "server %s is ready." % self.name
                 return
             except WorkerError:
-                pass
+                # Don't sleep before noticing a worker that has already died;
+                status = self.process.poll()
+                if status != None:
+                    break
 
-            if time.time() - start_time > timeout:
+            if monotonic() - start_time > timeout:
                 self.process.terminate()
                 self.process.wait()
                 self.process = None
                 raise WorkerError(None, self.name + " Taking too long to start.")
-            
-            time.sleep(time_delta)
+
+            # Back off exponentially, from 10ms up to 250ms between probes;
+            time.sleep(min(0.25, 0.01 * 2 ** attempts))
+            attempts += 1
 
             status = self.process.poll()
 
         errors = None
-        if hasattr(self.process, "stderr") and self.process.stderr:
-            errors = self.process.stderr.read()
+        if self.process.has_stderr:
+            errors = drain_pipe(self.process.stderr)
         self.process = None
         raise WorkerError(self.name, errors)
 
@@ -270,6 +569,7 @@ class Manager(object):
                 self.process.wait()
 
             self.process = None
+            self.invalidate_health()
 
     def wait(self):
         """Wait for the worker process to exit."""
@@ -277,3 +577,55 @@ class Manager(object):
         if self.process:
             self.process.wait()
             self.process = None
+
+    def wait_until(self, fd__):
+        """
+        Wait for the worker process to exit, or for *fd__* to become readable.
+
+        Passing the read end of a pipe given to signal.set_wakeup_fd() lets the 
+        caller wake up cleanly on a signal, without doing any work in a 
+        signal handler.
+
+        :param fd__: the file descriptor to watch.
+        :type fd__: int
+        :returns: **True** if *fd__* became readable, **False** if the worker exited.
+        """
+
+        while self.process:
+            try:
+                readable, _unused_w, _unused_x = select.select([fd__], [], [], 0.25)
+            except select.error, ex:
+                if ex.args[0] != errno.EINTR:
+                    raise
+                continue
+            if readable:
+                return True
+            if self.process.poll() != None:
+                self.process = None
+        return False
+
+def ready_wait_all(managers, timeout=10.0):
+    """
+    Wait until the worker subprocesses of several managers are responding to requests.
+
+    Connection attempts to every manager's host:port share one epoll loop 
+    (see readiness.wait_all_tcp_up()), so the workers are waited for 
+    concurrently and the total wait is about that of the slowest worker, 
+    not the sum of all of them. Each manager's ready_wait() is then called 
+    with the time remaining to confirm its health and to report any failure.
+
+    :param managers: the managers to wait for; their workers must already be started.
+    :type managers: list of Manager
+    :param timeout: Give the servers this many seconds to start.
+    :type timeout: float, seconds
+    :raises: **WorkerError** if any worker is not ready within the time limit.
+    """
+
+    deadline = monotonic() + timeout
+    targets = [(m.host, m.port, m.process.pid) for m in managers if m.process and getattr(m, "port", None)]
+    if targets and hasattr(select, "epoll"):
+        # Workers that aren't up are left for ready_wait() to report;
+        readiness.wait_all_tcp_up(targets, deadline)
+
+    for manager in managers:
+        manager.ready_wait(timeout=max(0.0, deadline - monotonic()))
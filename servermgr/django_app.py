@@ -8,25 +8,38 @@ Django process management.
 Use this module to run a django app.
 """
 
-import multiprocessing
+import logging
 import os
 import socket
+import subprocess
 import sys
 
 import base
 import my_setproctitle
 
+log = logging.getLogger("servermgr")
+
+# module name -> directory, filled in by get_module_directory();
+_module_directories = {}
 
 def get_module_directory(module_name):
     """Find the filesystem directory where a module lives."""
 
+    app_dir = _module_directories.get(module_name)
+    if app_dir:
+        return app_dir
+
     try:
-        __import__(module_name)
-        app_dir = os.path.dirname(sys.modules[module_name].__file__)
+        module = sys.modules.get(module_name)
+        if module is None:
+            __import__(module_name)
+            module = sys.modules[module_name]
+        app_dir = os.path.dirname(module.__file__)
+        _module_directories[module_name] = app_dir
         return app_dir
     except ImportError, ex:
-        print >> sys.stderr, ex
-        print >> sys.stderr, "Cannot find settings module " + module_name
+        log.error("%s", ex)
+        log.error("Cannot find settings module %s", module_name)
         sys.exit(1)
 
 class Manager(base.Manager):
@@ -45,13 +58,12 @@ class Manager(base.Manager):
 
     def __init__(self, host, port, settings, name="DjangoApp", process_name=None, **kwargs):
 
-        super(Manager, self).__init__(name=name, **kwargs)
+        super(Manager, self).__init__(name=name, process_name=process_name, **kwargs)
 
         self.host = host
         self.port = port
         self.settings = settings
         self.settings_dir = get_module_directory(settings)
-        self.process_name = process_name
 
     def health(self):
         """
@@ -60,14 +72,42 @@ class Manager(base.Manager):
         :raises: **base.WorkerError** if we cannot create a socket connection to app.
         """
         try:
-            s__ = socket.create_connection((self.host, self.port))
-            s__.close()
+            base.connect_probe(self.host, self.port)
         except socket.error, ex:
             raise base.WorkerError(ex)
 
+    @staticmethod
+    def launch(host, port, settings, settings_dir, process_name=None):
+        """
+        Run the Django app as a fastcgi server; this is the body of the subprocess.
+
+        :param host: the interface to listen on.
+        :param port: the port to listen on.
+        :type port: int
+        :param settings: name of the django settings module
+        :param settings_dir: the directory containing the settings module
+        :param process_name: the string to diplay in 'ps'
+        """
+
+        if process_name:
+            my_setproctitle.setproctitle(process_name)
+
+        sys.path.insert(0, settings_dir)
+        os.environ["DJANGO_SETTINGS_MODULE"] = settings
+        from django.core.management.commands import runfcgi
+        cmd = runfcgi.Command()
+
+        # XXX We should allow configuration of the options below;
+        cmd.handle("host="+host,
+                   "port="+str(port),
+                   "method=prefork",
+                   "daemonize=False",
+                   "maxchildren=2",
+                   "maxspare=2")
+
     def start(self, wait=True, timeout=10.0):
         """
-        Start the Django app in its own process.
+        Start the Django app in a fresh python process.
 
         :param wait: If true, call self.ready_wait() after starting the subprocess.
         :param timeout: When calling ready_wait(), use this timeout value.
@@ -75,28 +115,18 @@ class Manager(base.Manager):
         :raises: **base.WorkerError** if the worker hasn't started before timeout elapses.
         """
 
-        def launch_django():
-            "The Django subprocess."
-
-            if self.process_name:
-                my_setproctitle.setproctitle(self.process_name)
-
-            sys.path.insert(0, self.settings_dir)
-            os.environ["DJANGO_SETTINGS_MODULE"] = self.settings
-            from django.core.management.commands import runfcgi
-            cmd = runfcgi.Command()
-
-            # XXX We should allow configuration of the options below;
-            cmd.handle("host="+self.host,
-                       "port="+str(self.port),
-                       "method=prefork",
-                       "daemonize=False",
-                       "maxchildren=2",
-                       "maxspare=2")
-            
-        process = multiprocessing.Process(target=launch_django)
-        process.start()
-        self.process = process        
+        # Start from a new interpreter rather than forking this one, so the
+        # child doesn't inherit whatever the parent process has loaded.
+        # Run the child in its own session, so a control-C meant for the
+        # parent isn't also delivered to the app;
+        self.process = subprocess.Popen([sys.executable, "-m", "servermgr._django_launcher",
+                                         "--host", self.host,
+                                         "--port", str(self.port),
+                                         "--settings", self.settings,
+                                         "--settings-dir", self.settings_dir,
+                                         "--process-name", self.process_name or ""],
+                                        close_fds=True, preexec_fn=os.setsid,
+                                        env=base.launcher_env())
 
         if wait:
             self.ready_wait(timeout=timeout)
@@ -105,7 +135,8 @@ def main():
     """main routine."""
 
     import optparse
-    import subprocess
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(message)s")
 
     default_host = "localhost"
     
@@ -125,11 +156,11 @@ def main():
     process_name = options.name
 
     if options.fcgi:
-        print >> sys.stderr, "Creating fcgi server on %s:%d" % (host, port)
+        log.info("Creating fcgi server on %s:%d", host, port)
         server = Manager(host, port, settings, process_name=process_name)
-        print >> sys.stderr, "starting server..."
+        log.info("starting server...")
         server.start()
-        print >> sys.stderr, "server ready."
+        log.info("server ready.")
         server.wait()
     else:
         os.chdir(get_module_directory(settings))
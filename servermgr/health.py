@@ -0,0 +1,129 @@
+# -*- mode: python; tab-width:8; py-indent-offset:4; indent-tabs-mode:nil -*-
+
+"""
+Check the health of several managers at once.
+"""
+
+import Queue
+import threading
+
+import base
+
+class Future(object):
+    """The pending outcome of a call submitted to a **ThreadPool**."""
+
+    def __init__(self):
+
+        self._done = threading.Event()
+        self._result = None
+        self._exception = None
+
+    def _run(self, func, args):
+        "Make the call, recording its outcome."
+
+        try:
+            self._result = func(*args)
+        except Exception, ex:  #pylint: disable=W0703
+            self._exception = ex
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """Wait at most *timeout* seconds for the call to finish; return **True** if it has."""
+        return self._done.wait(timeout)
+
+    def result(self, timeout=None):
+        """
+        Return the result of the call, or raise the exception it raised.
+
+        :param timeout: wait at most this many seconds for the call to finish.
+        :type timeout: float, seconds
+        :raises: **base.WorkerError** if the call hasn't finished within *timeout*.
+        """
+        if not self.wait(timeout):
+            raise base.WorkerError(None, "timed out")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+class ThreadPool(object):
+    """
+    A fixed number of threads running submitted calls, in the manner of 
+    concurrent.futures.ThreadPoolExecutor, which python 2 lacks.
+
+    :param workers: the number of threads.
+    :type workers: int
+    """
+
+    def __init__(self, workers):
+
+        self._calls = Queue.Queue()
+        self._workers = workers
+        for _unused in range(workers):
+            thread = threading.Thread(target=self._work)
+            # Daemonic, so a hung call can't keep the interpreter from exiting;
+            thread.daemon = True
+            thread.start()
+
+    def _work(self):
+        "Body of a worker thread: run calls until told to stop."
+
+        while True:
+            call = self._calls.get()
+            if call is None:
+                return
+            future, func, args = call
+            future._run(func, args)  #pylint: disable=W0212
+
+    def submit(self, func, *args):
+        """
+        Queue a call of func(*args).
+
+        :returns: a **Future** for the outcome of the call.
+        """
+        future = Future()
+        self._calls.put((future, func, args))
+        return future
+
+    def shutdown(self):
+        """Let the threads exit once the calls already submitted are done; doesn't wait for them."""
+
+        for _unused in range(self._workers):
+            self._calls.put(None)
+
+def health_many(managers, timeout=5.0):
+    """
+    Run the health() checks of several managers in parallel.
+
+    The checks are submitted with Manager.health_async() to a pool of up to 
+    32 threads, so a single slow worker cannot hold up the others; a check 
+    that hasn't finished when the timeout expires is reported as failed.
+
+    :param managers: the managers to check.
+    :type managers: list of Manager
+    :param timeout: stop waiting for the checks after this many seconds.
+    :type timeout: float, seconds
+    :returns: a list of (manager, ok, error) tuples in the same order as *managers*; 
+      *error* is the exception raised by the check, or **None**.
+    """
+
+    if not managers:
+        return []
+
+    pool = ThreadPool(min(32, len(managers)))
+    try:
+        futures = [manager.health_async(pool) for manager in managers]
+        deadline = base.monotonic() + timeout
+
+        results = []
+        for manager, future in zip(managers, futures):
+            if not future.wait(max(0.0, deadline - base.monotonic())):
+                results.append((manager, False, base.WorkerError(None, manager.name + " health check timed out.")))
+                continue
+            try:
+                future.result()
+                results.append((manager, True, None))
+            except Exception, ex:  #pylint: disable=W0703
+                results.append((manager, False, ex))
+        return results
+    finally:
+        pool.shutdown()
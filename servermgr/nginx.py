@@ -8,12 +8,29 @@ Nginx process management.
 Use this module to configure and manage a dedicated nginx server.
 """
 
+import errno
 import os
+import signal
+import socket
 import subprocess
-import urllib
 
 import base
 
+# directories already created or found by _ensure_dir();
+_ensured_dirs = set()
+
+def _ensure_dir(path):
+    """Create the directory *path* if it doesn't exist, remembering the ones we've seen."""
+
+    if path in _ensured_dirs:
+        return
+    try:
+        os.makedirs(path)
+    except OSError, ex:
+        if ex.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
+    _ensured_dirs.add(path)
+
 class _ConfigBuilder(object):
     """
     Nginx configuration file builder.
@@ -97,46 +114,36 @@ class _ConfigBuilder(object):
         }
     """
 
-    @staticmethod
-    def _generate_mapping(map_info):
-        """Format the configuration section for a particular type of url mapping."""
-
-        block, info_dict = map_info
-        config_data = block % info_dict
-
-        return config_data
-
     def __init__(self, host, port, base_dir, http_root):
         
         self.host = host
         self.port = port
         self.base_dir = base_dir
         self.http_root = http_root
+        self._etc = os.path.join(base_dir, "etc", "nginx")
+        self._logdir = os.path.join(base_dir, "logs", "nginx")
+        self._rundir = os.path.join(base_dir, "run")
+        self._tmpdir = os.path.join(base_dir, "tmp", "nginx")
+        # (url_prefix, config block) pairs; each block is formatted once, when 
+        # the mapping is added;
         self.mappings = []
 
     def _write_config(self, file_handle):
         """Write the nginx configuration file."""
 
-        tmpl_vars = { "etc"    : os.path.join(self.base_dir, "etc", "nginx"),
-                      "logdir" : os.path.join(self.base_dir, "logs", "nginx"),
-                      "rundir" : os.path.join(self.base_dir, "run"),
-                      "tmpdir" : os.path.join(self.base_dir, "tmp", "nginx"),
+        tmpl_vars = { "etc"    : self._etc,
+                      "logdir" : self._logdir,
+                      "rundir" : self._rundir,
+                      "tmpdir" : self._tmpdir,
                       "root"   : self.http_root,
                       "port"   : self.port
                       }
 
         for key in "etc", "logdir", "rundir", "tmpdir":
-            dirname = tmpl_vars[key]
-            if not os.path.exists(dirname):
-                os.makedirs(dirname)
+            _ensure_dir(tmpl_vars[key])
 
-        config_blocks = []
-        for mapping in self.mappings:
-            config_blocks.append(_ConfigBuilder._generate_mapping(mapping))
-
-        tmpl_vars["config_blocks"] = ''.join(config_blocks)
-        config_data = [_ConfigBuilder.CONFIG_TEMPLATE % tmpl_vars]
-        file_handle.write('\n'.join(config_data))
+        tmpl_vars["config_blocks"] = ''.join(block for _unused_prefix, block in self.mappings)
+        file_handle.write(_ConfigBuilder.CONFIG_TEMPLATE % tmpl_vars)
 
     def add_filesystem_mapping(self, url_prefix, directory):
         """
@@ -152,7 +159,7 @@ class _ConfigBuilder(object):
             directory += "/"
 
         d__ = dict(url_prefix=url_prefix, directory=directory)
-        self.mappings.append((_ConfigBuilder.FILESYSTEM_BLOCK, d__))
+        self.mappings.append((url_prefix, _ConfigBuilder.FILESYSTEM_BLOCK % d__))
 
     def add_redirect_mapping(self, url_prefix, pattern, rewrite):
         """
@@ -168,7 +175,7 @@ class _ConfigBuilder(object):
         :type rewrite: string 
         """
         d__ = dict(url_prefix=url_prefix, pattern=pattern, rewrite=rewrite)
-        self.mappings.append((_ConfigBuilder.REDIRECT_BLOCK, d__))
+        self.mappings.append((url_prefix, _ConfigBuilder.REDIRECT_BLOCK % d__))
 
     def add_fastcgi_mapping(self, url_prefix, destination):
         """
@@ -180,7 +187,7 @@ class _ConfigBuilder(object):
         :type destination: string
         """
         d__ = dict(url_prefix=url_prefix, destination=destination)
-        self.mappings.append((_ConfigBuilder.FCGI_BLOCK, d__))
+        self.mappings.append((url_prefix, _ConfigBuilder.FCGI_BLOCK % d__))
 
     def add_http_mapping(self, url_prefix, destination):
         """
@@ -192,7 +199,7 @@ class _ConfigBuilder(object):
         :type destination: string
         """
         d__ = dict(url_prefix=url_prefix, destination=destination)
-        self.mappings.append((_ConfigBuilder.HTTP_PROXY_BLOCK, d__))
+        self.mappings.append((url_prefix, _ConfigBuilder.HTTP_PROXY_BLOCK % d__))
 
 
 class Manager(base.Manager, _ConfigBuilder):
@@ -222,14 +229,14 @@ class Manager(base.Manager, _ConfigBuilder):
 
     def health(self):
         """
-        Check on the health of the Solr server.
+        Check on the health of the nginx server.
         
-        :raises: **base.WorkerError** if the server is not responding.
+        :raises: **base.WorkerError** if the server is not accepting connections.
         """
 
         try: 
-            urllib.urlopen("http://%s:%d/nginx_status" % (self.host, self.port))
-        except IOError, ex:
+            base.connect_probe(self.host, self.port, timeout=1.0)
+        except socket.error, ex:
             raise base.WorkerError(ex)
 
     def start(self, wait=True, timeout=10.0):
@@ -243,21 +250,52 @@ class Manager(base.Manager, _ConfigBuilder):
 
         """
 
-        config_file = os.path.join(self.base_dir, "etc", "nginx", "nginx.conf")
-        if not os.path.exists(os.path.dirname(config_file)):
-            os.makedirs(os.path.dirname(config_file))
-
-        file_handle = file(config_file, "w+")
-        self._write_config(file_handle)
-        file_handle.close()
+        config_file = self._write_config_file()
         self.process = subprocess.Popen(["nginx",
                                          "-c", config_file],
-                                        stdout=file("/dev/null"), 
+                                        stdout=base.devnull(), 
                                         stderr=subprocess.PIPE,
                                         close_fds=True)
         if wait:
             self.ready_wait(timeout=timeout)
 
+    def _write_config_file(self):
+        """Write nginx.conf and return its path."""
+
+        config_file = os.path.join(self._etc, "nginx.conf")
+        _ensure_dir(self._etc)
+
+        with open(config_file, "w", 1 << 16) as file_handle:
+            self._write_config(file_handle)
+        return config_file
+
+    def reload(self):
+        """
+        Rewrite the config file and, if nginx is running, tell it to reload it.
+
+        Nginx reloads asynchronously; requests may be served with the old 
+        configuration for a short time after this returns.
+        """
+
+        self._write_config_file()
+        if self.process:
+            os.kill(self.process.pid, signal.SIGHUP)
+
+    def remap(self, url_prefix, directory):
+        """
+        Map *url_prefix* to *directory*, replacing any existing mapping for *url_prefix*, 
+        and reload the configuration of a running server.
+
+        :param url_prefix: url prefix.
+        :type url_prefix: string
+        :param directory: directory name
+        :type directory: string
+        """
+
+        self.mappings = [m for m in self.mappings if m[0] != url_prefix]
+        self.add_filesystem_mapping(url_prefix, directory)
+        self.reload()
+
 def main():
     """
     You can use this script to start a copy of Nginx.
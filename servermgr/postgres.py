@@ -13,12 +13,11 @@ Environment Variables
 
 POSTGRES_VERSION - if specified, this will be the default version of postgres. The 
 documentation for the **Manager** class describes how the version of postgres is chosen.
+The default version is chosen once, when the first **Manager** is created.
 
 """
 
-import copy
 import os
-import psycopg2
 import subprocess
 
 import base
@@ -26,6 +25,9 @@ import base
 class DatabaseException(base.WorkerError):
     """Database exceptions."""
 
+# Results of the checks below that only need to be made once per process;
+_startup_checks = {}
+
 def _check_lockdir_permissions():
     """
     Make sure we have permission to create a postgres postfile.
@@ -33,8 +35,12 @@ def _check_lockdir_permissions():
     :raises: **DatabaseException** if we do not have write permission on the lockfile directory.
     """
     
+    if _startup_checks.get("lockdir_ok"):
+        return
+
     if not os.access("/var/run/postgresql", os.W_OK):
         raise DatabaseException("We require write access to the postgres lockfile directory, /var/run/postgresql.")
+    _startup_checks["lockdir_ok"] = True
 
 def _get_default_postgres_version():
     """
@@ -42,36 +48,48 @@ def _get_default_postgres_version():
 
     If the environment variable POSTGRES_VERSION is set, use that.
     Otherwise, use the largest numbered directory in /usr/lib/postgresql.
+    The choice is made the first time this is called.
 
     :returns: the default version of postgres, or **None** if we can't determine the default postgres version.
     """
 
+    if "pg_version" not in _startup_checks:
+        _startup_checks["pg_version"] = _find_default_postgres_version()
+    return _startup_checks["pg_version"]
+
+def _find_default_postgres_version():
+    """Look up the default version of postgres; see _get_default_postgres_version()."""
+
     environ_version = os.environ.get("POSTGRES_VERSION", None)
     if environ_version:
         return environ_version
 
     # Pick the version with the largest number in the directory /usr/lib/postgresql;
     try:
-        return max([(float(d), d) for d in os.listdir("/usr/lib/postgresql")])[1]
-    # bad directory;
-    except OSError: 
-        pass
-    # can't convert name to a float;
-    except ValueError: 
+        return max(os.listdir("/usr/lib/postgresql"), key=float)
+    # bad directory, or can't convert name to a float;
+    except (OSError, ValueError):
         pass
     
     return None
 
 
+# pg_version -> (env, new_path_element), filled in by _env_with_postgres_path();
+_postgres_envs = {}
+
 def _env_with_postgres_path(pg_version):
     """
-    Return a new environment with Postgres bin directories append to the end.
+    Return an environment with Postgres bin directories append to the end.
+
+    The environment is built once per postgres version and shared; callers must not modify it.
     """
 
-    env = copy.copy(os.environ)
-    new_path_element = "/usr/lib/postgresql/%s/bin" % pg_version
-    env["PATH"] += ":" + new_path_element
-    return env, new_path_element
+    if pg_version not in _postgres_envs:
+        env = dict(os.environ)
+        new_path_element = "/usr/lib/postgresql/%s/bin" % pg_version
+        env["PATH"] = env.get("PATH", "") + ":" + new_path_element
+        _postgres_envs[pg_version] = (env, new_path_element)
+    return _postgres_envs[pg_version]
 
 def _initialize_directory(directory, pg_version):
     """Initialize a postgres data directory.
@@ -92,10 +110,9 @@ def _initialize_directory(directory, pg_version):
         ex.strerror += ": initdb; new path element:" + new_path_elem
         raise ex
 
-    process.wait()
-
-    messages = process.stdout.read()
-    errors = process.stderr.read()
+    # communicate() drains both pipes while waiting, so a chatty initdb 
+    # can't fill a pipe and deadlock;
+    messages, errors = process.communicate()
     if errors.find("WARNING") >= 0:
         messages += errors
         errors = ""
@@ -159,6 +176,9 @@ class Manager(base.Manager):
         :raises: **WorkerError** if we cannot connect to the database
         """
 
+        # Imported here so that starting postgres doesn't require loading psycopg2;
+        import psycopg2
+
         try:
             psycopg2.connect(database="postgres", port=self.port)
             return
@@ -180,7 +200,7 @@ class Manager(base.Manager):
                                              "-D", self.db_dir,
                                              "-h", self.host,
                                              "-p", str(self.port)],
-                                            stdout=file("/dev/null"), stderr=subprocess.PIPE,
+                                            stdout=base.devnull(), stderr=subprocess.PIPE,
                                             close_fds=True, env=env)
         except OSError, ex:
             ex.strerror += ": postgres; new path element:" + new_path_elem
@@ -0,0 +1,126 @@
+# -*- mode: python; tab-width:8; py-indent-offset:4; indent-tabs-mode:nil -*-
+
+"""
+Pools of pre-started worker processes.
+
+Starting a python worker often spends most of its time importing modules and 
+setting up before it can do any work. A **Prewarm** pool does that part ahead 
+of time: each child runs its setup, then blocks on a pipe until the pool 
+hands it out and tells it to go on.
+"""
+
+import multiprocessing
+import os
+import Queue
+import subprocess
+
+def _warm_child(factory, release_fd, other_fds):
+    "Body of a pool child: run the setup, then wait to be released."
+
+    for fd__ in other_fds:
+        os.close(fd__)
+
+    proceed = factory()
+    if os.read(release_fd, 1):
+        proceed()
+
+class Prewarm(object):
+    """
+    A pool of child processes that have done their setup ahead of time.
+
+    Each child handed out by acquire() is replaced by a new one, so the pool 
+    keeps *count* children warm until close() is called.
+
+    :param factory: called in each child, a fork of this process, as soon as 
+      it starts; it does the setup work and returns a callable that the child 
+      runs once it is handed out by acquire(). Alternatively, a command line, 
+      as a list, to run each child in a fresh process; the command does its 
+      setup, then reads from stdin, and goes on only if it reads a byte.
+    :param count: the number of children to keep warm.
+    :type count: int
+    :param env: the environment for children started from a command line; 
+      defaults to os.environ.
+    :type env: dict
+    """
+
+    def __init__(self, factory, count, env=None):
+
+        self.factory = factory
+        self.env = env
+        self._idle = Queue.Queue()
+        self._release_fds = set()
+        self._closed = False
+        for _unused in range(count):
+            self._spawn()
+
+    def _spawn(self):
+        "Start one child and add it to the idle queue."
+
+        if isinstance(self.factory, list):
+            # The child sees EOF on stdin, and exits, if this process goes away first;
+            process = subprocess.Popen(self.factory, stdin=subprocess.PIPE, close_fds=True, env=self.env)
+            write_fd = os.dup(process.stdin.fileno())
+            process.stdin.close()
+        else:
+            read_fd, write_fd = os.pipe()
+            # The child shouldn't hold the release pipes of any other child open;
+            other_fds = list(self._release_fds) + [write_fd]
+            process = multiprocessing.Process(target=_warm_child, args=(self.factory, read_fd, other_fds))
+            # Daemonic, so idle children are cleaned up when this process exits;
+            process.daemon = True
+            process.start()
+            os.close(read_fd)
+
+        self._release_fds.add(write_fd)
+        self._idle.put((process, write_fd))
+
+    def acquire(self):
+        """
+        Hand out a warm child and let it proceed, then start a replacement.
+
+        :returns: the child's multiprocessing.Process (or subprocess.Popen, if 
+          *factory* is a command line), or **None** if no warm child is left.
+        """
+
+        while True:
+            try:
+                process, write_fd = self._idle.get_nowait()
+            except Queue.Empty:
+                return None
+
+            self._release_fds.discard(write_fd)
+            try:
+                if _is_alive(process):
+                    os.write(write_fd, "g")
+                    break
+            finally:
+                os.close(write_fd)
+
+        if not self._closed:
+            self._spawn()
+        return process
+
+    def close(self):
+        """Terminate any children that haven't been handed out, and stop replacing them."""
+
+        self._closed = True
+        while True:
+            try:
+                process, write_fd = self._idle.get_nowait()
+            except Queue.Empty:
+                return
+
+            self._release_fds.discard(write_fd)
+            os.close(write_fd)
+            process.terminate()
+            if isinstance(process, subprocess.Popen):
+                process.wait()
+            else:
+                process.join()
+
+def _is_alive(process):
+    "Tell whether a pool child, a multiprocessing.Process or subprocess.Popen, is still running."
+
+    if isinstance(process, subprocess.Popen):
+        return process.poll() is None
+    return process.is_alive()
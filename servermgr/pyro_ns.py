@@ -8,7 +8,6 @@ Pyro module management.
 Use this module to manage a Pyro name server.
 """
 
-import copy
 import subprocess
 import os
 import sys
@@ -17,6 +16,9 @@ import Pyro.naming
 
 import base
 
+# Reuse a located name server proxy for health checks for this many seconds;
+NS_TTL = 5.0
+
 class Manager(base.Manager):
     """Pyro manager object.
 
@@ -26,28 +28,44 @@ class Manager(base.Manager):
     :param data_dir: name of the pyro data directory
     :keyword name: the program name
     :keyword process_name: the string to diplay in 'ps'
+    :keyword health_ttl: for this many seconds after a health check, health() repeats its outcome.
     """
 
     __implements__ = base.ManagerInterface
 
-    def __init__(self, host, port, data_dir, name="pyro_ns", process_name="Pyro NameServer", **kwargs):
+    def __init__(self, host, port, data_dir, name="pyro_ns", process_name="Pyro NameServer", health_ttl=1.0, **kwargs):
         
-        super(Manager, self).__init__(name=name, **kwargs)
+        super(Manager, self).__init__(name=name, process_name=process_name, **kwargs)
 
         self.host = host
         self.port = port
         self.data_dir = data_dir
-        self.process_name = process_name
+        self.health_ttl = health_ttl
+        self._ns = None
+        self._ns_ts = 0.0
 
+    @base.cached_health
     def health(self):
         """
         Check Pyro health.
 
         :raises: **base.WorkerError** if we cannot locate the Pyro name server.
         """
+
+        # A recently located name server just needs to answer a ping;
+        now = base.monotonic()
+        if self._ns is not None and now - self._ns_ts < NS_TTL:
+            try:
+                self._ns.ping()
+                return
+            except Exception:  #pylint: disable=W0703
+                self._ns = None
+
         try:
-            Pyro.naming.NameServerLocator().getNS(host=self.host, port=self.port)
+            self._ns = Pyro.naming.NameServerLocator().getNS(host=self.host, port=self.port)
+            self._ns_ts = now
         except Pyro.errors.PyroError, ex:
+            self._ns = None
             raise base.WorkerError(ex)
     
     def start(self, wait=True, timeout=10.0):
@@ -59,25 +77,26 @@ class Manager(base.Manager):
         :type timeout: float, number of seconds
         :raises: **base.WorkerError** if the worker hasn't started before timeout elapses.
         """
-        env = copy.copy(os.environ)
+        self.invalidate_health()
+        self._ns = None
+        env = base.launcher_env()
         env["PYRO_STORAGE"] = self.data_dir
 
-        # Note: Can't set the ps display unless we write a custom pyro-ns script;
-        process = subprocess.Popen(["pyro-ns",
+        # Run the name server through our launcher, so it can set the ps display.
+        # It gets its own session, so a control-C meant for this process 
+        # doesn't kill it before we shut it down;
+        process = subprocess.Popen([sys.executable, "-m", "servermgr._pyro_ns_launcher",
+                                    self.process_name or "",
                                     "-n", self.host,
                                     "-p", str(self.port),
                                     "-d"],
-                                   env=env)
+                                   stdout=base.devnull(), stderr=base.devnull(),
+                                   close_fds=True, preexec_fn=os.setsid, env=env)
         self.process = process
 
         if wait:
             self.ready_wait(timeout=timeout)
 
-def interrupt(_unused_signum, _unused_frame):
-    """Handle user stopping with control-C."""
-    print >> sys.stderr, "Keyboard interrupt, exiting."
-    sys.exit()
-
 def main():
     """
     You can use this script to start a copy of the pyro nameserver; however, you could 
@@ -93,10 +112,16 @@ def main():
                             Pyro data directory
 """
     
+    import fcntl
     import optparse
     import signal
 
-    signal.signal(signal.SIGINT, interrupt)
+    # On control-C, the signal machinery writes a byte to this pipe, and 
+    # wait_until() below returns; nothing runs inside the signal handler;
+    wakeup_read, wakeup_write = os.pipe()
+    fcntl.fcntl(wakeup_write, fcntl.F_SETFL, fcntl.fcntl(wakeup_write, fcntl.F_GETFL) | os.O_NONBLOCK)
+    signal.set_wakeup_fd(wakeup_write)
+    signal.signal(signal.SIGINT, lambda _unused_signum, _unused_frame: None)
 
     default_host = "localhost"
     default_port = 7604
@@ -126,7 +151,9 @@ def main():
     print "starting nameserver"
     server.start()
     print "nameserver ready"
-    server.wait()
+    if server.wait_until(wakeup_read):
+        print >> sys.stderr, "Keyboard interrupt, exiting."
+        server.stop()
 
 if __name__ == "__main__":
     main()
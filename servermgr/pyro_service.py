@@ -10,36 +10,112 @@ Use this module to manage a pyro service.
 
 import multiprocessing
 import signal
+import subprocess
 import sys
 
 import Pyro.core
 import Pyro.errors
+import Pyro.naming
 
 import base
 import my_setproctitle
+from prewarm import Prewarm
+
+# Re-resolve the service through the nameserver at least this often, in seconds;
+PROXY_TTL = 300.0
+
+def _prepare(process_name):
+    """
+    Do the part of the service startup that doesn't depend on the service.
+
+    :returns: a Pyro daemon, ready to be handed to _serve().
+    """
+
+    if process_name:
+        my_setproctitle.setproctitle(process_name)
+
+    Pyro.core.initServer()
+    return Pyro.core.Daemon()
+
+def _load_service(service):
+    """Create an instance of the class named by *service*, a 'module:classname' string."""
+
+    module_name, class_name = service.split(":")
+    __import__(module_name)
+    return getattr(sys.modules[module_name], class_name)()
+
+def _serve(daemon, service, service_name, ns_host, ns_port):
+    """Register *service* with the nameserver and handle requests until interrupted."""
+
+    if isinstance(service, basestring):
+        service = _load_service(service)
+
+    def interrupt(_unused_signum, _unused_frame):
+        sys.exit()
+
+    ns = Pyro.naming.NameServerLocator().getNS(host=ns_host, port=ns_port)
+
+    def unregister():
+        "Unregister the service."
+
+        try:
+            ns.unregister(service_name)
+        except Pyro.errors.NamingError:
+            pass
+
+    unregister()
+    daemon.useNameServer(ns)
+    daemon.connect(service, service_name)
+    signal.signal(signal.SIGINT, interrupt)
+
+    try: 
+        daemon.requestLoop()
+    finally:
+        daemon.shutdown(True)
+        del daemon
+        try: 
+            unregister()
+        except Exception:
+            pass
 
 class Manager(base.Manager):
     """
     Pyro service manager object.
 
     :param service_name: the Pyro service name for this module.
-    :param service: The object used to handle Pyro requests.
+    :param service: The object used to handle Pyro requests, or a 'module:classname' 
+      string naming the class to instantiate in the service process. When a string 
+      is given, the service runs in a fresh python process instead of a fork of this one.
     :param ns_host: Pyro nameserver host.
     :param ns_port: Pyro nameserver port.
     :type ns_port: int
+    :param prewarm: the number of service processes to keep started ahead of time; 
+      each start() uses one of them, so it needn't wait for Pyro to initialize, 
+      and another is started in its place. They are started by the first start(), 
+      and again by the first start() after a stop(), which terminates those left over.
+    :type prewarm: int
+    :param health_ttl: for this many seconds after a health check, health() repeats its outcome.
+    :type health_ttl: float, seconds
     """
     __implements__ = base.ManagerInterface
 
-    def __init__(self, service_name, service, ns_host, ns_port, process_name="Pyro Service", **kwargs):
+    def __init__(self, service_name, service, ns_host, ns_port, process_name="Pyro Service", prewarm=0, health_ttl=1.0, **kwargs):
         
-        super(Manager, self).__init__(**kwargs)
+        super(Manager, self).__init__(process_name=process_name, **kwargs)
 
         self.ns_host = ns_host
         self.ns_port = ns_port
         self.service_name = service_name
         self.service = service
-        self.process_name = process_name
-
+        self.health_ttl = health_ttl
+        self._proxy = None
+        self._last_resolve = 0.0
+        self.prewarm = prewarm
+        self.started_warm = False
+        # Built by start(), and closed by stop();
+        self._pool = None
+
+    @base.cached_health
     def health(self):
         """
         Check the health of the Pyro Server.
@@ -47,70 +123,123 @@ class Manager(base.Manager):
         :raises: **base.WorkerError** if we cannot invoke the **health** method of the Pyro Server.
         """
         try:
-            proxy = Pyro.core.getProxyForURI("PYRONAME://%s:%d/%s" % (self.ns_host, self.ns_port, self.service_name))
-            proxy.health()
+            try:
+                self._get_proxy().health()
+            except (Pyro.errors.ConnectionClosedError, Pyro.errors.ProtocolError, Pyro.errors.NamingError):
+                # The service may have moved; look it up again and retry once;
+                self._proxy = None
+                self._get_proxy().health()
         except Exception, ex:
+            self._proxy = None
             raise base.WorkerError(ex)
 
+    def _get_proxy(self):
+        "Return a proxy for the service, resolving it through the nameserver if needed."
 
-    def start(self, wait=True, timeout=10.0):
-        """
-        Launch the Pyro Service in a fresh python environment.
+        now = base.monotonic()
+        if self._proxy is None or now - self._last_resolve > PROXY_TTL:
+            self._proxy = Pyro.core.getProxyForURI("PYRONAME://%s:%d/%s" % (self.ns_host, self.ns_port, self.service_name))
+            self._last_resolve = now
+        return self._proxy
 
-        :param host:   the nameserver host
-        :param port:   the nameserver port
-        :type port: int
-        :keyword process_name: the displayed program name;
-        :keyword module_name: execute function 'main' in the named module;
+    @staticmethod
+    def launch(service, service_name, ns_host, ns_port, process_name=None, wait_for_release=False):
+        """
+        Run a Pyro service; this is the body of the subprocess.
+
+        :param service: the object used to handle Pyro requests, or a 'module:classname' string.
+        :param service_name: the Pyro service name.
+        :param ns_host: Pyro nameserver host.
+        :param ns_port: Pyro nameserver port.
+        :type ns_port: int
+        :param process_name: the string to diplay in 'ps'
+        :param wait_for_release: if true, wait after initializing Pyro until a byte 
+          is read from stdin, and exit without serving on EOF; see prewarm.Prewarm.
         """
 
-        def unregister():
-            "Unregister the service."
+        daemon = _prepare(process_name)
+        if wait_for_release and not sys.stdin.read(1):
+            return
+        _serve(daemon, service, service_name, ns_host, ns_port)
 
-            try:
-                ns.unregister(self.service_name)
-            except Pyro.errors.NamingError:
-                pass
+    def _launch(self):
+        "Body of a service process started on demand."
 
-        def launch_pyro_service():
-            "Start the service."
+        Manager.launch(self.service, self.service_name, self.ns_host, self.ns_port, self.process_name)
 
-            def interrupt(_unused_signum, _unused_frame):
-                sys.exit()
+    def _warm_start(self):
+        "Runs in a prewarmed process: prepare now, and serve once handed out."
 
-            if self.process_name:
-                my_setproctitle.setproctitle(self.process_name)
+        daemon = _prepare(self.process_name)
+        return lambda: _serve(daemon, self.service, self.service_name, self.ns_host, self.ns_port)
 
-            Pyro.core.initServer()
-            unregister()
+    def _launcher_command(self):
+        "Command line to run a 'module:classname' service in a fresh python process."
+
+        return [sys.executable, "-m", "servermgr._pyro_service_launcher",
+                "--service", self.service,
+                "--service-name", self.service_name,
+                "--ns-host", self.ns_host,
+                "--ns-port", str(self.ns_port),
+                "--proctitle", self.process_name or ""]
+
+    def _make_pool(self):
+        "Start the prewarmed service processes."
+
+        if isinstance(self.service, basestring):
+            # Keep warm fresh interpreters, not forks of this process;
+            return Prewarm(self._launcher_command() + ["--prewarm"], self.prewarm, env=base.launcher_env())
+        return Prewarm(self._warm_start, self.prewarm)
+
+    def start(self, wait=True, timeout=10.0):
+        """
+        Launch the Pyro Service in its own process.
 
-            daemon = Pyro.core.Daemon()
-            daemon.useNameServer(ns)
-            daemon.connect(self.service, self.service_name)
-            signal.signal(signal.SIGINT, interrupt)
-
-            try: 
-                daemon.requestLoop()
-            finally:
-                daemon.shutdown(True)
-                del daemon
-                try: 
-                    unregister(self.service_name)
-                except Exception:
-                    pass
+        :param wait: If true, call self.ready_wait() after starting the subprocess.
+        :param timeout: When calling ready_wait(), use this timeout value.
+        :type timeout: float, number of seconds
+        :raises: **IOError** if the Pyro nameserver cannot be reached.
+        :raises: **base.WorkerError** if the worker hasn't started before timeout elapses.
+
+        If the manager prewarms, this first starts its prewarmed processes, 
+        if they're not already running, then uses one of them; 
+        self.started_warm tells whether it did.
+        """
 
         try:
-            ns = Pyro.naming.NameServerLocator().getNS(host=self.ns_host, port=self.ns_port)
+            Pyro.naming.NameServerLocator().getNS(host=self.ns_host, port=self.ns_port)
         except Pyro.errors.PyroError, ex:
             raise IOError("Cannot connect to Pyro nameserver at %s:%d" % (self.ns_host, self.ns_port), ex)
 
-        process = multiprocessing.Process(target=launch_pyro_service)
-        process.start()
+        self._proxy = None
+        self.invalidate_health()
+        if self.prewarm and self._pool is None:
+            self._pool = self._make_pool()
+        process = self._pool.acquire() if self._pool else None
+        self.started_warm = process is not None
+        if process is None and isinstance(self.service, basestring):
+            process = subprocess.Popen(self._launcher_command(), close_fds=True, env=base.launcher_env())
+        elif process is None:
+            process = multiprocessing.Process(target=self._launch)
+            process.start()
         self.process = process
 
         if wait:
             self.ready_wait(timeout=timeout)
 
+    def stop(self, wait=True):
+        """
+        Terminate the service process, and any prewarmed processes not yet used.
+
+        :param wait: If True, wait for the service process to exit.
+        :type wait: boolean
+        """
+
+        if self._pool:
+            self._pool.close()
+            self._pool = None
+        super(Manager, self).stop(wait=wait)
+
 
 def main():
     """main routine."""
@@ -0,0 +1,149 @@
+# -*- mode: python; tab-width:8; py-indent-offset:4; indent-tabs-mode:nil -*-
+
+"""
+Wait for a worker to start accepting tcp connections.
+
+Connection attempts wait in epoll, so they return as soon as the worker's 
+port accepts a connection; the worker itself is checked every 50ms, so a 
+worker that dies during startup is noticed promptly.
+"""
+
+import select
+import socket
+import struct
+import time
+
+# time.monotonic() is not available before python 3.3; fall back to the wall clock.
+monotonic = getattr(time, "monotonic", time.time)
+
+class NotReady(Exception):
+    """Exception raised when a worker exits, or the deadline passes, before its port is up."""
+
+def start_connections(host, port):
+    """
+    Start non-blocking connections to every address of host:port.
+
+    :returns: a list of sockets with connections in progress; a socket becomes 
+      writable when its attempt finishes, and SO_ERROR then tells whether it connected.
+    """
+    sockets = []
+    for family, socktype, proto, _unused_name, addr in \
+            socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM):
+        s__ = socket.socket(family, socktype, proto)
+        s__.setblocking(0)
+        s__.connect_ex(addr)
+        sockets.append(s__)
+    return sockets
+
+def close_connections(sockets):
+    """Close sockets from start_connections(), without leaving them in TIME_WAIT."""
+
+    for s__ in sockets:
+        s__.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        s__.close()
+
+def _exited(pid):
+    """Tell whether process *pid* has exited, without reaping it."""
+
+    try:
+        with open("/proc/%d/stat" % pid) as stat:
+            state = stat.read().rsplit(")", 1)[1].split()[0]
+    except IOError:
+        return True
+    return state in ("Z", "X")
+
+def wait_all_tcp_up(targets, deadline=None):
+    """
+    Wait until each of several host:port pairs accepts a tcp connection.
+
+    The connection attempts to every target share one epoll loop, so the 
+    total wait is about that of the slowest target, not the sum of all of 
+    them. A target with a pid is given up on as soon as that process exits; 
+    processes are checked every 50ms, without reaping them.
+
+    :param targets: (host, port, pid) tuples; pid is the process that should 
+      start listening on host:port, or **None** not to watch a process.
+    :type targets: list of tuples
+    :param deadline: give up at this time, as returned by monotonic(); 
+      **None** means wait indefinitely.
+    :type deadline: float
+    :returns: a dict mapping each target to "ready", or to a **NotReady** 
+      exception saying why it isn't.
+    """
+
+    outcomes = {}
+    pending = list(targets)
+    poller = select.epoll()
+    try:
+        attempts = 0
+        while pending:
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
+                for host, port, pid in pending:
+                    outcomes[(host, port, pid)] = NotReady("%s:%s not accepting connections in time." % (host, port))
+                break
+
+            # Wake up now and then to check on the processes, if there are any;
+            timeout = -1 if remaining is None else remaining
+            if any(pid is not None for _unused_host, _unused_port, pid in pending):
+                timeout = 0.05 if timeout < 0 else min(timeout, 0.05)
+
+            sockets, waiting = {}, {}
+            try:
+                for target in pending:
+                    for s__ in start_connections(target[0], target[1]):
+                        sockets[s__] = target
+                        waiting[s__.fileno()] = s__
+                        poller.register(s__.fileno(), select.EPOLLOUT)
+
+                while waiting:
+                    events = poller.poll(timeout)
+                    if not events:
+                        break
+                    for fd__, _unused_event in events:
+                        s__ = waiting.pop(fd__)
+                        poller.unregister(fd__)
+                        if s__.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                            outcomes[sockets[s__]] = "ready"
+            finally:
+                for fd__ in waiting:
+                    poller.unregister(fd__)
+                close_connections(sockets)
+
+            for host, port, pid in pending:
+                if (host, port, pid) not in outcomes and pid is not None and _exited(pid):
+                    outcomes[(host, port, pid)] = NotReady("process %d exited." % pid)
+            pending = [target for target in pending if target not in outcomes]
+
+            if pending:
+                # Every remaining connection was refused; back off before trying again;
+                delay = min(0.25, 0.01 * 2 ** attempts)
+                if deadline is not None:
+                    delay = min(delay, max(0.0, deadline - monotonic()))
+                time.sleep(delay)
+                attempts += 1
+    finally:
+        poller.close()
+    return outcomes
+
+def wait_tcp_up(host, port, pid=None, deadline=None):
+    """
+    Wait until host:port accepts a tcp connection; see wait_all_tcp_up().
+
+    :param host: the interface to connect to.
+    :type host: string
+    :param port: the port to connect to.
+    :type port: int
+    :param pid: the process that should start listening on host:port.
+    :type pid: int
+    :param deadline: give up at this time, as returned by monotonic(); 
+      **None** means wait indefinitely.
+    :type deadline: float
+    :returns: "ready"
+    :raises: **NotReady** if process *pid* exits or the deadline passes first.
+    """
+
+    outcome = wait_all_tcp_up([(host, port, pid)], deadline)[(host, port, pid)]
+    if outcome != "ready":
+        raise outcome
+    return outcome
@@ -5,9 +5,14 @@ import re
 
 from distutils.core import setup
 
-v = file(os.path.join(os.path.dirname(__file__), 'servermgr', '__init__.py'))
-VERSION = re.compile(r'.*__version__ = "(.*?)"', re.S).match(v.read()).group(1)
-v.close()
+_VERSION_RE = re.compile(r'__version__\s*=\s*"([^"]+)"')
+
+with open(os.path.join(os.path.dirname(__file__), 'servermgr', '__init__.py')) as v:
+    for line in v:
+        m = _VERSION_RE.match(line)
+        if m:
+            VERSION = m.group(1)
+            break
 
 setup(name="servermgr",
       version=VERSION,
@@ -1,8 +1,11 @@
 
 
+import httplib
 import os
+import socket
 import sys
-import urllib
+import time
+from contextlib import contextmanager
 
 sys.path.insert(0, "..")
 
@@ -11,47 +14,101 @@ import servermgr.nginx
 
 TEST_DIR = "/tmp/nginx_test"
 
-def map_directory(url, directory):
+# One keep-alive connection, reused by every request in the tests;
+CONN = httplib.HTTPConnection("localhost", 8080)
 
+def http_get(path):
+
+    try:
+        CONN.request("GET", path)
+        return CONN.getresponse().read()
+    except (httplib.HTTPException, socket.error):
+        # nginx was restarted or reloaded and dropped the connection; reconnect once;
+        CONN.close()
+        CONN.request("GET", path)
+        return CONN.getresponse().read()
+
+def local_port():
+    """Return the local port of CONN, which changes only when it reconnects."""
+
+    return CONN.sock.getsockname()[1]
+
+@contextmanager
+def nginx_fixture():
+
+    m = servermgr.nginx.Manager("localhost", 8080, TEST_DIR)
     try:
-        m = servermgr.nginx.Manager("localhost", 8080, TEST_DIR)
-        m.add_filesystem_mapping(url, directory)
         m.start()
     except Exception, ex:
         print >> sys.stderr, "Failed to start nginx."
         raise
 
-    return m
+    try:
+        yield m
+    finally:
+        m.stop()
 
 
 def read_status_test():
 
     m = servermgr.nginx.Manager("localhost", 8080, TEST_DIR)
     m.start()
-    status = urllib.urlopen("http://localhost:8080/nginx_status").read()
+    status = http_get("/nginx_status")
+    port = local_port()
+    http_get("/nginx_status")
+    reused = local_port() == port
+    m.stop()
     if not status.startswith("Active connections:"):
         raise Exception("unexpected status returned")
-
-def check_map_url_to_filesystem(url_prefix, dirname):
+    assert reused, "keep-alive connection was not reused"
+
+def wait_for_data(path, expected, timeout=5.0):
+    """
+    Request *path* until nginx serves *expected* there twice in a row 
+    over the same kept-alive connection.
+
+    Nginx applies a new configuration asynchronously after a reload, and 
+    never applies one it rejects, so give up after *timeout* seconds. The 
+    old workers close their kept-alive connections as they exit, and 
+    http_get() reconnects, so the connection is only reused once the new 
+    workers are serving it.
+    """
+
+    deadline = time.time() + timeout
+    served_on = None
+    while True:
+        data = http_get(path)
+        if data == expected:
+            if local_port() == served_on:
+                return
+            served_on = local_port()
+        else:
+            served_on = None
+            time.sleep(0.05)
+        if time.time() > deadline:
+            raise Exception("%s serves %r, not %r, over one connection" % (path, data[:200], expected))
+
+def check_map_url_to_filesystem(m, url_prefix, dirname):
     
-    m = map_directory(url_prefix, dirname)
-    
-    write_data = "This is a test.\n"
+    # Different data for each case, so a file left by an earlier case can't pass;
+    write_data = "This is a test of %s -> %s.\n" % (url_prefix, dirname)
     f = file(os.path.join(dirname, "testdata.txt"), "w")
     f.write(write_data)
     f.close()
-    read_data = urllib.urlopen("http://localhost:8080/testdata.txt").read()
-    assert write_data == read_data
-    m.stop()
+
+    m.remap(url_prefix, dirname)
+    wait_for_data(url_prefix.rstrip('/') + '/testdata.txt', write_data)
 
 def map_tests():
 
-    m = check_map_url_to_filesystem("/", TEST_DIR)
-    m = check_map_url_to_filesystem("/mapped", TEST_DIR)
-    m = check_map_url_to_filesystem("/mapped/", TEST_DIR)
-    m = check_map_url_to_filesystem("/", TEST_DIR+'/')
-    m = check_map_url_to_filesystem("/mapped", TEST_DIR+'/')
-    m = check_map_url_to_filesystem("/mapped/", TEST_DIR+'/')
+    with nginx_fixture() as m:
+        for url_prefix, dirname in (("/", TEST_DIR),
+                                    ("/mapped", TEST_DIR),
+                                    ("/mapped/", TEST_DIR),
+                                    ("/", TEST_DIR+'/'),
+                                    ("/mapped", TEST_DIR+'/'),
+                                    ("/mapped/", TEST_DIR+'/')):
+            check_map_url_to_filesystem(m, url_prefix, dirname)
 
 def main():
     read_status_test()
@@ -7,7 +7,8 @@ import Pyro.core
 
 sys.path.insert(0, "..")
 
-import servermgr.pyro
+import servermgr.health
+import servermgr.pyro_ns
 import servermgr.pyro_service
 
 
@@ -28,37 +29,67 @@ class MathService(Pyro.core.ObjBase):
 
     def add(self, *args):
 
-        val = reduce(lambda x,y: x+y, args, 0)
-        return val
+        return sum(args)
 
-def local_add(self, *args):
+    def add_many(self, vectors):
 
-    val = reduce(lambda x,y: x+y, args, 0)
-    return val
+        return [sum(v) for v in vectors]
+
+    def batch(self, calls):
+
+        # Evaluate a list of (method_name, args) pairs in one round trip;
+        for name, _unused_args in calls:
+            if name.startswith("_"):
+                raise ValueError("cannot call private method %s" % name)
+        return [getattr(self, name)(*args) for name, args in calls]
+
+def local_add(*args):
+
+    return sum(args)
 
 def pyro_ns_test():
 
-    m = servermgr.pyro.Manager(NS_HOST, NS_PORT, NS_DIR)
+    m = servermgr.pyro_ns.Manager(NS_HOST, NS_PORT, NS_DIR)
     m.start()
     m.health()
+    pool = servermgr.health.ThreadPool(1)
+    m.health_async(pool).result(5.0)
+    pool.shutdown()
     m.stop()
 
 def pyro_server_test():
 
-    m = servermgr.pyro.Manager(NS_HOST, NS_PORT, NS_DIR)
+    for prewarm in (0, 1):
+        check_pyro_server(prewarm)
+
+def check_pyro_server(prewarm):
+
+    m = servermgr.pyro_ns.Manager(NS_HOST, NS_PORT, NS_DIR)
     m.start()
-    m2 = servermgr.pyro_service.Manager(TEST_SERVICE, MathService(), NS_HOST, NS_PORT)
+    m2 = servermgr.pyro_service.Manager(TEST_SERVICE, MathService(), NS_HOST, NS_PORT, prewarm=prewarm)
     m2.start()
+    for manager, ok, error in servermgr.health.health_many([m, m2]):
+        assert ok, "%s: %s" % (manager.name, error)
     client = Pyro.core.getProxyForURI("PYRONAME://%(host)s:%(port)d/%(service)s" \
                                           % dict(host=NS_HOST, port=NS_PORT, service=TEST_SERVICE))
-    for i in range(1, 10):
-        v = range(i)
+    full = range(10)
+    vectors = [full[:i] for i in range(1, 10)]
+    results = client.add_many(vectors)
+    for v, r2 in zip(vectors, results):
         r1 = local_add(*v)
-        r2 = client.add(*v)
         print "vector:", v, "sum:", r1, r2
         assert r1 == r2
 
+    assert client.batch([("add", v) for v in vectors]) == results
+    assert m2.started_warm == bool(prewarm)
+
     m2.stop()
+    if prewarm:
+        # stop() closed the pool; the next start() builds it again;
+        m2.start()
+        assert m2.started_warm
+        m2.health()
+        m2.stop()
     m.stop()
 
 def main():